@@ -23,134 +23,481 @@ Lib\site-packages\enchant\data\mingw32\share\enchant\hunspell
 (e.g., on my computer:
 C:\Users\peter\AppData\Local\Programs\Python\Python38-32\Lib\site-packages\enchant\data\mingw32\share\enchant\hunspell
 )
+
+If the orjson package is installed (pip install orjson),
+json files will be read and written using orjson.
 """
 
+import codecs
+import collections
+import functools
 import re
 import os
 import enchant
 import json
+import mmap
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from openiti.helper.ara import ar_tok
 from openiti.helper.funcs import get_all_text_files_in_folder
 
-# load the enchant dictionary to be used:
-d = enchant.Dict("ar")
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HEADER_END = "#META#Header#End"
+_HEADER_END_BYTES = HEADER_END.encode("utf-8")
+
+# regular expressions used in every book are compiled only once:
+_PAGE_RE = re.compile(r"(PageV\d+P\d+)")
+_TOK_RE_CACHE = dict()
+_RE_PATTERN_TYPE = type(_PAGE_RE)  # (re.Pattern only exists in Python 3.7+)
+
+def _compile_token_regex(token_regex):
+    """Get a compiled version of the token regex (compiled only once).
+
+    Args:
+        token_regex (str or compiled regex): regular expression pattern
+            describing the tokens that need to be checked;
+            compiled patterns (also those compiled with another
+            regex library with the same interface) are used as they are.
+
+    Returns:
+        compiled regex
+    """
+    if not isinstance(token_regex, str):  # already compiled
+        return token_regex
+    try:
+        return _TOK_RE_CACHE[token_regex]
+    except KeyError:
+        tok_pat = re.compile(token_regex)
+        _TOK_RE_CACHE[token_regex] = tok_pat
+        return tok_pat
+
+# enchant dictionaries are loaded only when they are first needed,
+# once per process (the dictionary handle of a parent process
+# cannot be shared with worker processes):
+_dicts = dict()
+
+def _get_dict(lang="ar"):
+    """Get the enchant dictionary for `lang` for the current process.
 
-def check_with_pyEnchant(tok):
+    Args:
+        lang (str): language code of the enchant dictionary
+
+    Returns:
+        enchant.Dict
+    """
+    key = (os.getpid(), lang)
+    try:
+        return _dicts[key]
+    except KeyError:
+        _dicts[key] = enchant.Dict(lang)
+        return _dicts[key]
+
+@functools.lru_cache(maxsize=1000000)
+def check_with_pyEnchant(tok, lang="ar"):
     """Check whether a token is recognized by the spell checker.
 
+    Results are memoized: tokens in OpenITI texts repeat heavily,
+    so most tokens need to be passed to the spell checker only once
+    (the cache is kept for the whole session, across books;
+    it holds at most a million tokens, so that the long tail
+    of unique OCR errors does not make it grow without bounds).
+
+    To use another enchant dictionary, pass e.g.
+    `functools.partial(check_with_pyEnchant, lang="fa")`
+    as the `spellcheck_func`.
+
     Args:
         tok (str): token to be checked
+        lang (str): language code of the enchant dictionary
 
     Returns:
         bool
     """
-    return d.check(tok)
+    return _get_dict(lang).check(tok)
+
+def _get_hunspell_encoding(aff_bytes):
+    """Get the Python codec name for the encoding declared
+    in the SET line of a Hunspell .aff file.
+
+    Args:
+        aff_bytes (bytes): contents of the .aff file
+
+    Returns:
+        str, or None if the encoding is not known to Python
+    """
+    m = re.search(rb"^(?:\xef\xbb\xbf)?SET[ \t]+(\S+)", aff_bytes, flags=re.M)
+    # Hunspell's default encoding is ISO8859-1:
+    encoding = m.group(1).decode("ascii", "replace") if m else "ISO8859-1"
+    encoding = re.sub("^microsoft-", "", encoding, flags=re.I)  # microsoft-cp1251
+    try:
+        encoding = codecs.lookup(encoding).name
+    except LookupError:
+        return None
+    if encoding == "utf-8":  # files may start with a byte order mark
+        return "utf-8-sig"
+    return encoding
+
+def get_max_token_length(dic_fp, aff_fp):
+    """Get the maximum length of the word forms a Hunspell dictionary
+    can recognize.
+
+    The maximum is calculated as the length of the longest stem in the
+    .dic file plus the longest prefix and suffix in the .aff file
+    (counted twice if affixes can be combined with other affixes).
+    Tokens longer than this can be counted as errors
+    without calling the spell checker.
+
+    Both files are decoded using the encoding declared in the SET line
+    of the .aff file (ISO8859-1 if there is no SET line).
+
+    Args:
+        dic_fp (str): path to the Hunspell .dic file
+        aff_fp (str): path to the Hunspell .aff file
+
+    Returns:
+        int, or None if the dictionary does not allow a maximum length
+            to be calculated (because it uses compounding,
+            or ignores or converts some characters, because its encoding
+            is unknown or the files cannot be decoded with it,
+            or because the .dic file contains no stems)
+    """
+    with open(aff_fp, mode="rb") as file:
+        aff_bytes = file.read()
+    encoding = _get_hunspell_encoding(aff_bytes)
+    if encoding is None:
+        return None
+    try:
+        aff = aff_bytes.decode(encoding)
+    except UnicodeDecodeError:
+        return None
+
+    max_affix = {"PFX": 0, "SFX": 0}
+    combinable = {"PFX": False, "SFX": False}
+    for line in aff.splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        # characters that are ignored or converted before the lookup
+        # (and compound words) don't allow a maximum length:
+        if (fields[0] in ("IGNORE", "ICONV")
+                or fields[0].startswith("COMPOUND")):
+            return None
+        # affix rule lines: PFX/SFX flag strip add[/flags] condition
+        if fields[0] in max_affix and len(fields) >= 5:
+            add, _, cont_flags = fields[3].partition("/")
+            if add != "0":
+                max_affix[fields[0]] = max(max_affix[fields[0]], len(add))
+            if cont_flags:
+                combinable[fields[0]] = True
+
+    max_stem = 0
+    try:
+        with open(dic_fp, mode="r", encoding=encoding) as file:
+            next(file, None)  # first line contains the number of stems
+            for line in file:
+                fields = line.split()
+                if fields:
+                    max_stem = max(max_stem, len(fields[0].split("/")[0]))
+    except UnicodeDecodeError:
+        return None
+    if not max_stem:  # empty or malformed .dic file
+        return None
+
+    max_len = max_stem
+    for affix_type in max_affix:
+        max_len += max_affix[affix_type] * (2 if combinable[affix_type] else 1)
+    return max_len
+
+def _read_text_lines(fp):
+    """Yield the lines of the OpenITI text file at `fp`
+    that follow the metadata header.
+
+    The file is memory-mapped: the end of the header is found
+    in the raw bytes, so that only the lines after the header
+    need to be decoded.
+
+    Args:
+        fp (str): path to a file containing an OpenITI text
+
+    Yields:
+        str
+    """
+    with open(fp, mode="rb") as file:
+        if not os.fstat(file.fileno()).st_size:  # empty files can't be mapped
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            i = mm.rfind(_HEADER_END_BYTES)
+            if i >= 0:  # if no header is found, the whole file is text
+                mm.seek(i + len(_HEADER_END_BYTES))
+            for line in iter(mm.readline, b""):
+                yield line.decode("utf-8")
+
+def _split_pages(t):
+    """Find the page boundaries in a text.
+
+    The text itself is not split, so that no copy of the text
+    needs to be made.
+
+    Args:
+        t (str): text
+
+    Yields:
+        (text, start, end, page_no) tuples (the page being text[start:end]);
+            the text after the last page number is yielded with page_no None
+    """
+    start = 0
+    for m in _PAGE_RE.finditer(t):
+        yield t, start, m.start(), m.group()
+        start = m.end()
+    yield t, start, len(t), None
+
+def _stream_pages(lines):
+    """Split a text into pages, line by line,
+    so that only one page needs to be held in memory.
+
+    Args:
+        lines (iterable): lines of text (e.g., an open file)
+
+    Yields:
+        (text, start, end, page_no) tuples (the page being text[start:end]);
+            the text after the last page number is yielded with page_no None
+    """
+    page = []
+    for line in lines:
+        parts = _PAGE_RE.split(line)
+        page.append(parts[0])
+        for i in range(1, len(parts), 2):
+            page_text = "".join(page)
+            yield page_text, 0, len(page_text), parts[i]
+            page = [parts[i+1]]
+    page_text = "".join(page)
+    yield page_text, 0, len(page_text), None
 
 def calculate_error_rate(t, spellcheck_func=check_with_pyEnchant,
-                         token_regex=ar_tok, long=8, verbose=False):
+                         token_regex=ar_tok, long=8, verbose=False,
+                         spellcheck_batch_func=None, max_len=None):
     """Get the error rate for each book and each page of a book.
 
     The function goes through every token on each page of the book
     and checks whether or not the `spellcheck_func` recognizes
-    the token. It counts the number of unrecognized tokens.
+    the token (every distinct token on a page is checked only once).
+    It counts the number of unrecognized tokens.
     In addition, it checks how many of these errors are in
     "over-long" tokens.
     Finally, an error rate (number of errors divided by number of tokens)
     is calculated for every page of the book, and every book as a whole.
 
+    All tokens of a page are collected before they are spell-checked,
+    so that a spell checker that can check many tokens in one call
+    can be plugged in using the `spellcheck_batch_func` argument.
+
     Args:
-        t (str): the text of the book as a string
+        t (str or iterable): the text of the book as a string,
+            or an iterable of the lines of the book (e.g., an open file)
         spellcheck_func (func): function to be used to check spelling
-        token_regex (str): regular expression pattern describing the
-            tokens that need to be checked
+        token_regex (str or compiled regex): regular expression pattern
+            describing the tokens that need to be checked
         long (int): minimum number of characters in a token to be
             considered a long token
         verbose (bool): if False, no output will be printed
+        spellcheck_batch_func (func): function that takes a list of tokens
+            and returns a sequence of booleans (True if the token is
+            recognized), e.g., a list or a numpy boolean array,
+            with one result for every token (a ValueError is raised
+            otherwise). If None, `spellcheck_func` will be called
+            for every token.
+        max_len (int): tokens longer than this will be counted as errors
+            without being spell-checked (see `get_max_token_length`).
+            If None, all tokens will be spell-checked.
 
     Returns:
         dict (containing the overall error rates and page-level error rates)
     """
-    errors = {"all": 0, "long": 0, "tok_count": 0, "page_errors": []}
-    page_errors = {"all": 0, "long": 0, "tok_count": 0, "page_no": ""}
-    for p in re.split("(PageV\d+P\d+)", t):
-        #print(p)
-        if p.startswith("Page"):  # end of page: save page_errors
-            if verbose and p.endswith("0"):
-                print(p)
-            page_errors["page_no"] = p
-            errors["page_errors"].append(page_errors)
-            page_errors = {"all": 0, "long": 0, "tok_count": 0, "page_no": ""}
-        else:  # analyze all tokens in the page:
-            if p: 
-                for m in re.finditer(token_regex, p):
-                    errors["tok_count"] += 1
-                    page_errors["tok_count"] += 1
-                    tok = m.group()
-                    if verbose:
-                        print("      ", tok, d.check(tok))
-                    #if d.check(tok) == False:
-                    if spellcheck_func(tok) == False:
-                        errors["all"] += 1
-                        page_errors["all"] += 1
-                        if len(tok) > long:
-                            errors["long"] += 1
-                            page_errors["long"] += 1
-    error_rate = errors["all"]/errors["tok_count"]
+    # book-level counts are kept in local variables
+    # and stored in the errors dictionary only at the end:
+    tok_count = all_ = long_ = 0
+    # page-level counts are stored column by column;
+    # they are converted to one dictionary per page only at the end:
+    page_nos, page_all, page_long, page_tok_count = [], [], [], []
+    tok_pat = _compile_token_regex(token_regex)
+    if not isinstance(tok_pat, _RE_PATTERN_TYPE):
+        # other regex libraries (e.g., re2) may not handle pos/endpos
+        # in time proportional to the page: tokenize a copy of the page
+        if tok_pat.groups:
+            def find_toks(text, start, end):
+                return [m.group() for m in tok_pat.finditer(text[start:end])]
+        else:
+            def find_toks(text, start, end):
+                return tok_pat.findall(text[start:end])
+    elif tok_pat.groups:  # findall would return the groups, not the tokens
+        def find_toks(text, start, end):
+            return [m.group() for m in tok_pat.finditer(text, start, end)]
+    else:  # findall does not create a match object for every token
+        find_toks = tok_pat.findall
+    if isinstance(t, str):
+        pages = _split_pages(t)
+    else:
+        pages = _stream_pages(t)
+    # local names for the functions used in the loop:
+    _len = len
+    Counter = collections.Counter
+    add_page_no = page_nos.append
+    add_page_all = page_all.append
+    add_page_long = page_long.append
+    add_page_tok_count = page_tok_count.append
+    for text, start, end, page_no in pages:
+        n_all = n_long = n_tok = 0
+        if end > start:  # analyze all tokens in the page:
+            toks = find_toks(text, start, end)
+            # spell-check every distinct token on the page only once:
+            counts = Counter(toks)
+            # (the length of every distinct token is calculated only once)
+            checked, checked_lens = [], []
+            errs = []  # (token, length) of the unrecognized tokens
+            for tok in counts:
+                n = _len(tok)
+                if max_len and n > max_len:  # too long to be spell-checked
+                    errs.append((tok, n))
+                else:
+                    checked.append(tok)
+                    checked_lens.append(n)
+            if spellcheck_batch_func:
+                results = spellcheck_batch_func(checked)
+                if _len(results) != _len(checked):
+                    raise ValueError("{} returned {} results for {} tokens".format(
+                        getattr(spellcheck_batch_func, "__name__",
+                                repr(spellcheck_batch_func)),
+                        _len(results), _len(checked)))
+            else:
+                results = map(spellcheck_func, checked)
+            for tok, n, recognized in zip(checked, checked_lens, results):
+                if verbose:
+                    print("      ", tok, recognized)
+                if not recognized:
+                    errs.append((tok, n))
+            n_tok = _len(toks)
+            for tok, n in errs:
+                c = counts[tok]
+                n_all += c
+                if n > long:
+                    n_long += c
+            tok_count += n_tok
+            all_ += n_all
+            long_ += n_long
+        if page_no:  # end of page: save the page's counts
+            if verbose and page_no.endswith("0"):
+                print(page_no)
+            add_page_no(page_no)
+            add_page_all(n_all)
+            add_page_long(n_long)
+            add_page_tok_count(n_tok)
+    errors = {"all": all_, "long": long_, "tok_count": tok_count}
+    errors["page_errors"] = [
+        {"all": a, "long": l, "tok_count": c, "page_no": no}
+        for no, a, l, c in zip(page_nos, page_all, page_long, page_tok_count)
+    ]
+    # (NB: books without any tokens get an error rate of 0)
+    error_rate = all_/tok_count if tok_count else 0.0
     errors["error_rate"] = error_rate
     if verbose:
         print("  error_rate:", 100*error_rate, "%")
-    long_rate = errors["long"]/errors["tok_count"]
+    long_rate = long_/tok_count if tok_count else 0.0
     errors["long_tokens_error_rate"] = long_rate
     return errors
 
+def _load_json(fp):
+    """Load the json file at `fp` (using orjson if it is available)."""
+    if orjson:
+        with open(fp, mode="rb") as file:
+            return orjson.loads(file.read())
+    with open(fp, mode="r", encoding="utf-8") as file:
+        return json.load(file)
+
+def _dump_json(obj, fp):
+    """Save `obj` as a json file at `fp` (using orjson if it is available)."""
+    if orjson:
+        with open(fp, mode="wb") as file:
+            file.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2
+                                               | orjson.OPT_SORT_KEYS
+                                               | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(fp, mode="w", encoding="utf-8") as file:
+            json.dump(obj, file, ensure_ascii=False, indent=2, sort_keys=True)
+
 def collect_spellcheck_error_data_in_file(fp, spellcheck_func,
                                           outfolder="error_data",
-                                          error_data={}, overwrite=False):
+                                          overwrite=False,
+                                          json_exists=None, max_len=None,
+                                          spellcheck_batch_func=None):
     """Collect "error" data for the text file at `fp` \
     using a spellchecker function.
 
-    This function creates a json file containing error data for each page.
-    It also adds the error data to the `error_data` dictionary.
+    This function creates a json file containing error data for each page,
+    and returns the book-level error data.
 
     Args:
         fp (str): path to a file containing an OpenITI text
         spellcheck_func (func): function to be used to check spelling
+        outfolder (str): path to the folder where the book-level
+            json file will be stored
         overwrite (bool): if True, book-level json files will be overwritten;
             if False, book-level error data will be read from the json
             files instead of re-analysing the text.
+        json_exists (bool): whether the book-level json file already
+            exists in the `outfolder`; if None, this will be checked
+            on disk.
+        max_len (int): tokens longer than this will be counted as errors
+            without being spell-checked (see `get_max_token_length`)
+        spellcheck_batch_func (func): function that spell-checks
+            all tokens of a page in one call (see `calculate_error_rate`)
+
+    Returns:
+        tuple (the version uri and the book-level error data,
+            without the page-level error data)
     """
     v_uri = os.path.basename(fp)
     outfp = os.path.join(outfolder, v_uri+"_error_data.json")
-    if overwrite or not os.path.exists(outfp):
-        # load text:
-        with open(fp, mode="r", encoding="utf-8") as file:
-            t = file.read()
-
-        # split off metadata header:
-        t = t.split("#META#Header#End")[-1]
-        
-        # get spellcheck data for this book:
-        error_data[v_uri] = calculate_error_rate(t)
+    if json_exists is None:
+        json_exists = os.path.exists(outfp)
+    if overwrite or not json_exists:
+        # get spellcheck data for this book,
+        # streaming the text (without its metadata header) page by page:
+        errors = calculate_error_rate(_read_text_lines(fp),
+                                      spellcheck_func=spellcheck_func,
+                                      max_len=max_len,
+                                      spellcheck_batch_func=spellcheck_batch_func)
         
         # save page-level error data for this book: 
-        with open(outfp, mode="w", encoding="utf-8") as file:
-            json.dump(error_data[v_uri], file,
-                      ensure_ascii=False, indent=2, sort_keys=True)
+        _dump_json(errors, outfp)
     else: # read existing error data from json file
-        with open(outfp, mode="r", encoding="utf-8") as file:
-            error_data[v_uri] = json.load(file)
+        errors = _load_json(outfp)
             
     # remove page-level error data from the corpus-wide statistics:
-    del error_data[v_uri]["page_errors"]
+    del errors["page_errors"]
+
+    return v_uri, errors
 
 def collect_spellcheck_error_data_in_folder(folder, tsv_fp, json_fp,
                                             outfolder="error_data",
                                             lang_code="ara",
                                             spellcheck_func=check_with_pyEnchant,
-                                            overwrite=False):
+                                            overwrite=False, max_workers=None,
+                                            max_len=None, spellcheck_batch_func=None):
     """Collect "error" data for all text files in the folder
     (and its subfolders) using a spellchecker.
 
+    The books are analysed in parallel, in separate processes
+    (unless `max_workers` is 1).
+    Books that cannot be analysed (e.g., because of an encoding error)
+    are reported and left out of the output; if no book could be analysed,
+    a RuntimeError is raised and the tsv and json output files
+    are not written.
+
     This function creates multiple outputs:
     
     * For each book, a json file containing error data for each page.
@@ -163,49 +510,133 @@ def collect_spellcheck_error_data_in_folder(folder, tsv_fp, json_fp,
         folder (str): path to a folder containing OpenITI text files
         tsv_fp (str): path to the tsv output file
         json_fp (str): path to the json output file
+        outfolder (str): path to the folder where the book-level
+            json files will be stored
         lang_code (str): language code used in the OpenITI URI;
             to make sure that only texts in the relevant language are spell-checked.
             Set to None if all files should be checked, regardless of their language.
         spellcheck_func (func): function to be used to check spelling
+            (NB: unless `max_workers` is 1, it must be defined
+            at the top level of a module, so that it can be passed
+            to the worker processes)
         overwrite (bool): if True, book-level json files will be overwritten;
             if False, book-level error data will be read from the json
             files instead of re-analysing the text.
+        max_workers (int): maximum number of worker processes;
+            if None, the number of processors on the machine is used.
+            If 1, all books are analysed in the current process,
+            without a process pool.
+        max_len (int): tokens longer than this will be counted as errors
+            without being spell-checked (see `get_max_token_length`)
+        spellcheck_batch_func (func): function that spell-checks
+            all tokens of a page in one call (see `calculate_error_rate`);
+            like `spellcheck_func`, it must be picklable
+            unless `max_workers` is 1.
     """
     # prepare json output dictionary:
     error_data = dict()
 
-    # prepare tsv output file:
-
-    # create empty tsv output file with header:
-    # (NB: existing tsv output file will be overwritten)
+    # prepare tsv output (rows are collected first, and written in one go):
     header = ["uri", "all", "long", "error_rate",
               "long_tokens_error_rate", "tok_count"]
     cols = header[1:]
-    with open(tsv_fp, mode="w", encoding="utf-8") as tsv_file:
-        print("writing corpus-wide data to", tsv_fp)
-        tsv_file.write("\t".join(header) + "\n")
-
-    # get error data for every book and write it to tsv:
-    with open(tsv_fp, mode="a", encoding="utf-8") as tsv_file:
-        for fp in get_all_text_files_in_folder(folder):
-            check = True
-            if lang_code:
-                if not "-"+lang_code in fp:
-                    check = False
-            if check: 
-                v_uri = os.path.basename(fp)
-                print(v_uri)
-                collect_spellcheck_error_data_in_file(fp, error_data=error_data,
-                                                      spellcheck_func = spellcheck_func,
-                                                      overwrite=overwrite)
-                
-                # write the book-level error data to the corpus-wide tsv file:
-                tsv_data = [v_uri,] + [str(error_data[v_uri][col]) for col in cols]
-                tsv_file.write("\t".join(tsv_data) + "\n")
-            
+    tsv_rows = ["\t".join(header) + "\n"]
+
+    # get the paths to all files that need to be checked
+    # (the language code is looked for only in the file name):
+    if lang_code:
+        lang_re = re.compile(r"-{}\d*(?:\.|$)".format(re.escape(lang_code)))
+    else:
+        lang_re = None
+    fps, v_uris = [], []
+    for fp in get_all_text_files_in_folder(folder):
+        v_uri = os.path.basename(fp)
+        if lang_re and not lang_re.search(v_uri):
+            continue
+        fps.append(fp)
+        v_uris.append(v_uri)
+
+    # list the book-level json files created in a previous run
+    # (one directory scan instead of a check for every book):
+    os.makedirs(outfolder, exist_ok=True)
+    existing = {entry.name for entry in os.scandir(outfolder)}
+
+    # get error data for every book:
+    book_kwargs = dict(outfolder=outfolder, overwrite=overwrite,
+                       max_len=max_len,
+                       spellcheck_batch_func=spellcheck_batch_func)
+    if max_workers == 1:
+        # analyse the books one by one in this process
+        # (the spellcheck functions then need not be picklable):
+        executor = None
+        jobs = [functools.partial(collect_spellcheck_error_data_in_file,
+                                  fp, spellcheck_func,
+                                  json_exists=v_uri+"_error_data.json" in existing,
+                                  **book_kwargs)
+                for fp, v_uri in zip(fps, v_uris)]
+    else:  # analyse the books in parallel, in worker processes
+        # (check first that the spellcheck functions can be passed to them):
+        try:
+            pickle.dumps((spellcheck_func, spellcheck_batch_func))
+        except Exception as e:
+            raise TypeError("spellcheck_func and spellcheck_batch_func must "
+                            "be picklable to be used in worker processes; "
+                            "use max_workers=1 to analyse the books "
+                            "in the current process") from e
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        futures = [executor.submit(collect_spellcheck_error_data_in_file,
+                                   fp, spellcheck_func,
+                                   json_exists=v_uri+"_error_data.json" in existing,
+                                   **book_kwargs)
+                   for fp, v_uri in zip(fps, v_uris)]
+        jobs = [future.result for future in futures]
+    first_error = None
+    try:
+        # collect the results in the original order of the files
+        # (a book that could not be analysed is skipped;
+        # errors that affect all books are raised):
+        for fp, job in zip(fps, jobs):
+            try:
+                v_uri, book_error_data = job()
+            except (pickle.PicklingError, BrokenProcessPool):
+                raise
+            except Exception as e:
+                print("ERROR: could not analyse", fp, ":", repr(e))
+                if first_error is None:
+                    first_error = e
+                continue
+            print(v_uri)
+            error_data[v_uri] = book_error_data
+            tsv_data = [v_uri,] + [str(error_data[v_uri][col]) for col in cols]
+            tsv_rows.append("\t".join(tsv_data) + "\n")
+    except BaseException:
+        # don't wait for the books that have not been started yet
+        # (e.g., after Ctrl-C):
+        if executor:
+            for future in futures:
+                future.cancel()
+        raise
+    finally:
+        if executor:
+            executor.shutdown()
+
+    # if no book could be analysed, the problem is not with a single book
+    # (e.g., the spell checker's dictionary is missing): don't overwrite
+    # the results of a previous run, and raise the first error:
+    if fps and not error_data:
+        raise RuntimeError("none of the {} books could be analysed; {} and {} "
+                           "were not written".format(len(fps), tsv_fp, json_fp)
+                           ) from first_error
+
+    # write the book-level error data to the corpus-wide tsv file:
+    # (NB: existing tsv output file will be overwritten)
+    print("writing corpus-wide data to", tsv_fp)
+    with open(tsv_fp, mode="w", encoding="utf-8", newline="",
+              buffering=1<<20) as tsv_file:
+        tsv_file.writelines(tsv_rows)
+
     # save corpus-level error data as json file:
-    with open(json_fp, mode="w", encoding="utf-8") as file:
-        json.dump(error_data, file, ensure_ascii=False, indent=2, sort_keys=True)
+    _dump_json(error_data, json_fp)
 
 
 if __name__ == "__main__":